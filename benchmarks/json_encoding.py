@@ -0,0 +1,87 @@
+"""Compare response encoding: stdlib json + manual isoformat vs orjson
+
+Builds payloads shaped like the get_my_games and get_admin_stats responses
+and times the old and new encoding paths. Run from the repository root:
+
+    python benchmarks/json_encoding.py [--games 200] [--number 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot import json_dumps  # noqa: E402
+
+
+def make_games(count: int) -> list:
+    """Rows as get_my_games reads them from the games table"""
+    now = datetime.now()
+    return [
+        {
+            'game_id': f'{i:08x}-0000-4000-8000-000000000000',
+            'game_type': ('quiz', 'truefalse', 'memory')[i % 3],
+            'title': f'Game number {i}',
+            'plays_count': i * 17,
+            'created_at': now - timedelta(minutes=i)
+        }
+        for i in range(count)
+    ]
+
+
+def make_dashboard() -> dict:
+    """Row as the dashboard snapshot reads it"""
+    return {
+        'total_users': 125000,
+        'pro_users': 3400,
+        'total_games': 48000,
+        'total_plays': 9100000,
+        'pending_requests': 12,
+        'generated_at': datetime.now()
+    }
+
+
+def games_stdlib(rows: list) -> bytes:
+    return json.dumps([
+        {**g, 'created_at': g['created_at'].isoformat()} for g in rows
+    ]).encode()
+
+
+def games_orjson(rows: list) -> bytes:
+    return json_dumps([dict(g) for g in rows])
+
+
+def dashboard_stdlib(row: dict) -> bytes:
+    return json.dumps({**row, 'generated_at': row['generated_at'].isoformat()}).encode()
+
+
+def dashboard_orjson(row: dict) -> bytes:
+    return json_dumps(row)
+
+
+def bench(label: str, old, new, arg, number: int):
+    assert json.loads(old(arg)) == json.loads(new(arg))
+    old_t = min(timeit.repeat(lambda: old(arg), number=number, repeat=5))
+    new_t = min(timeit.repeat(lambda: new(arg), number=number, repeat=5))
+    print(f"{label:<24} stdlib {old_t / number * 1e6:9.1f} us   "
+          f"orjson {new_t / number * 1e6:9.1f} us   x{old_t / new_t:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=200)
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    bench(f'get_my_games ({args.games})', games_stdlib, games_orjson,
+          make_games(args.games), args.number)
+    bench('get_admin_stats', dashboard_stdlib, dashboard_orjson,
+          make_dashboard(), args.number * 10)
+
+
+if __name__ == '__main__':
+    main()
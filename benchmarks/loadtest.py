@@ -0,0 +1,471 @@
+"""Load test bot.py against a local Postgres and a stub Telegram Bot API
+
+Starts a stub Bot API server, runs bot.py as a subprocess pointed at it and
+at --database-url, seeds users and games, then replays traffic mixes:
+
+    viral       one shared game opened by everyone, some leaderboard reads
+    classroom   classes of students submitting scores at the same moment
+    dashboard   admins polling the dashboard and the user list
+    webhook     a flood of /start updates through the webhook
+    mixed       all of the above at once
+
+and reports req/s, p50/p95/p99 latency and pool wait per endpoint. Before
+the scenarios it checks that submitted scores reach a loaded leaderboard. The
+database is written to, use a throwaway one:
+
+    createdb bot_bench
+    python benchmarks/loadtest.py --database-url postgresql://localhost/bot_bench \\
+        --save benchmarks/baseline.json
+    python benchmarks/loadtest.py --database-url postgresql://localhost/bot_bench \\
+        --compare benchmarks/baseline.json
+
+Pool wait comes from /metrics, which is per process: keep --workers 1 for
+exact numbers.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import aiohttp
+import asyncpg
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_TOKEN = "123456:LOADTEST"
+SECRET_TOKEN = "loadtest-secret"
+SCENARIOS = ('viral', 'classroom', 'dashboard', 'webhook')
+
+VIRAL_GAME = 'bench-viral'
+CLASS_GAMES = [f'bench-class-{i}' for i in range(20)]
+OTHER_GAMES = [f'bench-game-{i}' for i in range(50)]
+CREATOR_IDS = range(900_000_000, 900_000_050)
+PLAYER_BASE = 910_000_000
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# ========================
+# STUB TELEGRAM API
+# ========================
+class StubTelegram:
+    """Answers Bot API calls the way Telegram would, without any network"""
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self._message_id = 0
+
+    async def handle(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        data = await request.post()
+        if method == 'getWebhookInfo':
+            result = {'url': '', 'has_custom_certificate': False, 'pending_update_count': 0}
+        elif method == 'getChatMenuButton':
+            result = {'type': 'default'}
+        elif method in ('sendMessage', 'editMessageText'):
+            self._message_id += 1
+            result = {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(data.get('chat_id', 0)), 'type': 'private'},
+                'text': data.get('text', '')
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        return runner
+
+
+# ========================
+# BOT PROCESS
+# ========================
+def start_bot(args, api_port: int, telegram_port: int, log_file):
+    env = {
+        **os.environ,
+        'DATABASE_URL': args.database_url,
+        'BOT_TOKEN': BOT_TOKEN,
+        'SECRET_TOKEN': SECRET_TOKEN,
+        'TELEGRAM_API_URL': f'http://127.0.0.1:{telegram_port}',
+        'WEBHOOK_HOST': f'http://127.0.0.1:{api_port}',
+        'API_PORT': str(api_port),
+        'WEB_WORKERS': str(args.workers),
+        # Measure the app, not the throttle
+        'RATE_LIMIT_ENABLED': '0',
+    }
+    return subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'bot.py')],
+        env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+
+
+async def wait_ready(session, base_url: str, process, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"bot.py exited with {process.returncode}, see the log")
+        try:
+            async with session.get(f'{base_url}/readyz') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("bot.py did not become ready")
+
+
+async def seed(database_url: str, questions: int):
+    """Idempotent fixture data: creators, players and games"""
+    conn = await asyncpg.connect(database_url)
+    try:
+        await conn.executemany("""
+            INSERT INTO users (user_id, name, phone) VALUES ($1, $2, '+998000000000')
+            ON CONFLICT (user_id) DO NOTHING
+        """, [(uid, f'Creator {uid}') for uid in CREATOR_IDS])
+
+        question_set = json.dumps([
+            {
+                'question': f'Question {i}?',
+                'options': [f'Option {j}' for j in range(4)],
+                'answer': i % 4
+            }
+            for i in range(questions)
+        ])
+        games = [(VIRAL_GAME, CREATOR_IDS[0])]
+        games += [(g, CREATOR_IDS[i % len(CREATOR_IDS)]) for i, g in enumerate(CLASS_GAMES + OTHER_GAMES)]
+        await conn.executemany("""
+            INSERT INTO games (game_id, creator_id, game_type, title, questions)
+            VALUES ($1, $2, 'quiz', $1, $3::jsonb)
+            ON CONFLICT (game_id) DO NOTHING
+        """, [(game_id, creator, question_set) for game_id, creator in games])
+    finally:
+        await conn.close()
+
+
+# ========================
+# TRAFFIC
+# ========================
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, session, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                await response.read()
+                ok = response.status < 400
+        except aiohttp.ClientError:
+            ok = False
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[endpoint] += 1
+
+
+async def viral_user(session, base_url, recorder, stop_at):
+    while time.monotonic() < stop_at:
+        game_id = VIRAL_GAME if random.random() < 0.8 else random.choice(OTHER_GAMES)
+        await recorder.request(session, 'GET /api/games/{game_id}', 'GET',
+                               f'{base_url}/api/games/{game_id}')
+        if random.random() < 0.1:
+            await recorder.request(session, 'GET /api/games/{game_id}/leaderboard', 'GET',
+                                   f'{base_url}/api/games/{game_id}/leaderboard')
+
+
+async def classroom(session, base_url, recorder, stop_at, class_no, headers):
+    """30 students finish together, then the class waits for the next round"""
+    game_id = CLASS_GAMES[class_no % len(CLASS_GAMES)]
+    students = [PLAYER_BASE + class_no * 100 + i for i in range(30)]
+
+    async def submit(player_id):
+        score = random.randint(0, 10)
+        await recorder.request(
+            session, 'POST /api/games/{game_id}/score', 'POST',
+            f'{base_url}/api/games/{game_id}/score', headers=headers,
+            json={'player_id': player_id, 'player_name': f'Student {player_id}',
+                  'score': score, 'total': 10, 'percentage': score * 10}
+        )
+
+    while time.monotonic() < stop_at:
+        await asyncio.gather(*(submit(p) for p in students))
+        await recorder.request(session, 'GET /api/games/{game_id}/leaderboard', 'GET',
+                               f'{base_url}/api/games/{game_id}/leaderboard')
+        await asyncio.sleep(random.uniform(0.5, 1.5))
+
+
+async def check_leaderboard_updates(session, base_url, headers) -> list[str]:
+    """Scores written by the background flush must reach a loaded board
+
+    A durable score is visible as soon as it is acknowledged, a queued one
+    within a couple of flush windows, and neither may be hidden by a 304.
+    """
+    game_id = CLASS_GAMES[0]
+    url = f'{base_url}/api/games/{game_id}/leaderboard'
+    score_url = f'{base_url}/api/games/{game_id}/score'
+    async with session.get(url) as response:
+        etag = response.headers.get('ETag')
+        await response.read()
+
+    failures = []
+    for n, ack in enumerate(('durable', 'queued')):
+        player_id = PLAYER_BASE + 80_000 + int(time.time()) % 10_000 * 2 + n
+        async with session.post(score_url, headers=headers,
+                                json={'player_id': player_id, 'player_name': f'Check {player_id}',
+                                      'score': 10, 'total': 10, 'percentage': 100,
+                                      'ack': ack}) as response:
+            await response.read()
+        deadline = time.monotonic() + (0 if ack == 'durable' else 2)
+        while True:
+            async with session.get(f'{url}?around={player_id}',
+                                   headers={'If-None-Match': etag} if etag else None) as response:
+                body = await response.read()
+                found = response.status == 200 and f'Check {player_id}'.encode() in body
+            if found or time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(0.05)
+        if not found:
+            failures.append(f"{ack} score for player {player_id} missing from {game_id} leaderboard "
+                            f"(last status {response.status})")
+    return failures
+
+
+async def admin(session, base_url, recorder, stop_at, headers):
+    while time.monotonic() < stop_at:
+        await recorder.request(session, 'GET /api/admin/stats', 'GET',
+                               f'{base_url}/api/admin/stats', headers=headers)
+        if random.random() < 0.2:
+            await recorder.request(session, 'GET /api/admin/users', 'GET',
+                                   f'{base_url}/api/admin/users?limit=50', headers=headers)
+        await asyncio.sleep(0.5)
+
+
+async def webhook_sender(session, base_url, recorder, stop_at, update_ids):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}
+    while time.monotonic() < stop_at:
+        update_id = next(update_ids)
+        user_id = PLAYER_BASE + 50_000 + update_id % 5000
+        update = {
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': 'Load'},
+                'text': '/start',
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+            }
+        }
+        await recorder.request(session, 'POST /webhook', 'POST', f'{base_url}/webhook',
+                               headers=headers, json=update)
+
+
+def scenario_tasks(name, session, base_url, recorder, stop_at, concurrency, update_ids):
+    headers = {'Authorization': f'Bearer {SECRET_TOKEN}'}
+    if name == 'viral':
+        return [viral_user(session, base_url, recorder, stop_at) for _ in range(concurrency)]
+    if name == 'classroom':
+        return [classroom(session, base_url, recorder, stop_at, i, headers)
+                for i in range(max(1, concurrency // 10))]
+    if name == 'dashboard':
+        return [admin(session, base_url, recorder, stop_at, headers)
+                for _ in range(max(1, concurrency // 10))]
+    if name == 'webhook':
+        return [webhook_sender(session, base_url, recorder, stop_at, update_ids)
+                for _ in range(concurrency)]
+    return [
+        task
+        for part in SCENARIOS
+        for task in scenario_tasks(part, session, base_url, recorder, stop_at,
+                                   max(1, concurrency // len(SCENARIOS)), update_ids)
+    ]
+
+
+# ========================
+# REPORTING
+# ========================
+POOL_WAIT_RE = re.compile(r'^db_pool_acquire_seconds_(sum|count)\{route="([^"]*)"\} (\S+)$')
+
+
+async def pool_wait(session, base_url: str) -> dict:
+    """route -> [seconds waited, acquisitions] from /metrics"""
+    async with session.get(f'{base_url}/metrics') as response:
+        text = await response.text()
+    totals = defaultdict(lambda: [0.0, 0])
+    for line in text.splitlines():
+        match = POOL_WAIT_RE.match(line)
+        if match:
+            kind, route, value = match.groups()
+            totals[route][0 if kind == 'sum' else 1] = float(value)
+    return totals
+
+
+def percentile(ordered: list, pct: float) -> float:
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(recorder: Recorder, elapsed: float, before: dict, after: dict) -> dict:
+    results = {}
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        ordered = sorted(latencies)
+        route = endpoint.split(' ', 1)[1]
+        waited = after[route][0] - before[route][0]
+        acquired = after[route][1] - before[route][1]
+        results[endpoint] = {
+            'requests': len(ordered),
+            'errors': recorder.errors[endpoint],
+            'rps': round(len(ordered) / elapsed, 1),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+            'pool_wait_ms': round(waited / acquired * 1000, 3) if acquired else 0.0
+        }
+    return results
+
+
+def print_results(scenario: str, results: dict):
+    print(f"\n== {scenario}")
+    print(f"{'endpoint':<40} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'pool':>8} {'err':>6}")
+    for endpoint, r in results.items():
+        print(f"{endpoint:<40} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} "
+              f"{r['p99_ms']:>8} {r['pool_wait_ms']:>8} {r['errors']:>6}")
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Endpoints whose p95 or throughput moved past `tolerance` the wrong way"""
+    regressions = []
+    for scenario, endpoints in current.items():
+        for endpoint, r in endpoints.items():
+            base = baseline.get(scenario, {}).get(endpoint)
+            if not base:
+                continue
+            if r['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{scenario} {endpoint}: p95 {base['p95_ms']} -> {r['p95_ms']} ms")
+            if r['rps'] < base['rps'] * (1 - tolerance):
+                regressions.append(f"{scenario} {endpoint}: {base['rps']} -> {r['rps']} req/s")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ========================
+# MAIN
+# ========================
+async def run(args) -> int:
+    telegram = StubTelegram()
+    telegram_port, api_port = free_port(), free_port()
+    telegram_runner = await telegram.start(telegram_port)
+    base_url = f'http://127.0.0.1:{api_port}'
+    scenarios = SCENARIOS + ('mixed',) if args.scenario == 'all' else (args.scenario,)
+
+    log_file = open(args.log, 'w')
+    process = start_bot(args, api_port, telegram_port, log_file)
+    connector = aiohttp.TCPConnector(limit=0)
+    results = {}
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_ready(session, base_url, process)
+            await seed(args.database_url, args.questions)
+            update_ids = iter(range(int(time.time() * 1000), 1 << 62))
+            failures = await check_leaderboard_updates(
+                session, base_url, {'Authorization': f'Bearer {SECRET_TOKEN}'}
+            )
+            for line in failures:
+                print(f"CHECK FAILED {line}")
+
+            for scenario in scenarios:
+                recorder = Recorder()
+                before = await pool_wait(session, base_url)
+                started = time.monotonic()
+                stop_at = started + args.duration
+                await asyncio.gather(*scenario_tasks(
+                    scenario, session, base_url, recorder, stop_at, args.concurrency, update_ids
+                ))
+                elapsed = time.monotonic() - started
+                after = await pool_wait(session, base_url)
+                results[scenario] = summarize(recorder, elapsed, before, after)
+                print_results(scenario, results[scenario])
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log_file.close()
+        await telegram_runner.cleanup()
+    print(f"\nTelegram API calls: {dict(telegram.calls)}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'meta': {
+                    'revision': git_revision(),
+                    'recorded_at': datetime.now().isoformat(timespec='seconds'),
+                    'duration': args.duration,
+                    'concurrency': args.concurrency,
+                    'workers': args.workers,
+                    'questions': args.questions
+                },
+                'results': results
+            }, f, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline['results'], results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare} (revision {baseline['meta']['revision']})")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True, help='throwaway Postgres database')
+    parser.add_argument('--scenario', default='all', choices=SCENARIOS + ('mixed', 'all'))
+    parser.add_argument('--duration', type=float, default=20, help='seconds per scenario')
+    parser.add_argument('--concurrency', type=int, default=50, help='virtual users per scenario')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='WEB_WORKERS for bot.py, more than 1 needs LEADERBOARD_BACKEND=redis')
+    parser.add_argument('--questions', type=int, default=300, help='questions per seeded game')
+    parser.add_argument('--log', default='loadtest-bot.log', help='bot.py output')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative p95/throughput change before failing')
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == '__main__':
+    main()